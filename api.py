@@ -1,13 +1,27 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
 from typing import List, Optional
 import uvicorn
 
+import metrics
+from prefetch import PrefetchScheduler, PREFETCH_ENABLED
+
 # Import your existing functions
-from event_finder import get_meetup_recommendations  # Adjust import path as needed
+from event_finder import get_meetup_recommendations, SCORING_CONCURRENCY, SCORING_BATCH_SIZE, PRERANK_TOP_K, SCORING_CASCADE, COMPILE_INTERESTS, RECOMMENDATION_DEADLINE, MAX_DISTANCE_KM, GEOTILE_PRECISION, llm_circuits, hot_tiles, prefetch_tile, tile_needs_refresh  # Adjust import path as needed
+
+# Keeps the busiest geohash tiles fetched ahead of their TTL
+prefetcher = PrefetchScheduler(hot_tiles, refresh=prefetch_tile, needs_refresh=tile_needs_refresh)
 
-app = FastAPI(title="Meetup Recommendations API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PREFETCH_ENABLED and GEOTILE_PRECISION:
+        prefetcher.start()
+    yield
+    prefetcher.stop()
+
+app = FastAPI(title="Meetup Recommendations API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -22,23 +36,44 @@ class LocationQuery(BaseModel):
     latitude: float = Field(..., description="User's latitude")
     longitude: float = Field(..., description="User's longitude")
     interests: str = Field(..., description="User's interests as a text description")
-    num_events: Optional[int] = Field(default=20, description="Number of events to fetch")
+    num_events: int = Field(default=20, ge=1, description="Number of events to fetch")
     verbose: Optional[bool] = Field(default=False, description="Enable verbose output")
+    max_workers: Optional[int] = Field(default=None, ge=1, description="Max number of events scored concurrently")
+    batch_size: Optional[int] = Field(default=None, ge=1, description="Number of events rated per LLM call")
+    top_k: Optional[int] = Field(default=None, ge=0, description="Only score the top K lexical matches with the LLM (0 scores all)")
+    cascade: Optional[bool] = Field(default=None, description="Escalate uncertain scores from cheap to expensive models")
+    compile_interests: Optional[bool] = Field(default=None, description="Compile interests into a rubric once and use shorter per-event prompts")
+    include_usage: Optional[bool] = Field(default=False, description="Add LLM token, latency and cost totals to the response metadata")
+    deadline_seconds: Optional[float] = Field(default=None, gt=0, description="Time budget; events not scored by then are ranked by a local heuristic")
+    max_distance_km: Optional[float] = Field(default=None, gt=0, description="Drop events farther than this many km before scoring")
 
+# Plain def so FastAPI runs it in its threadpool and a slow request can't block the event loop
 @app.post("/api/recommendations")
-async def get_recommendations(query: LocationQuery):
+def get_recommendations(query: LocationQuery):
     try:
         recommendations = get_meetup_recommendations(
             lat=query.latitude,
             lon=query.longitude,
             interests=query.interests,
             num_events=query.num_events,
-            verbose=query.verbose
+            verbose=query.verbose,
+            max_workers=query.max_workers or SCORING_CONCURRENCY,
+            batch_size=query.batch_size or SCORING_BATCH_SIZE,
+            top_k=PRERANK_TOP_K if query.top_k is None else query.top_k,
+            cascade=SCORING_CASCADE if query.cascade is None else query.cascade,
+            use_rubric=COMPILE_INTERESTS if query.compile_interests is None else query.compile_interests,
+            include_usage=bool(query.include_usage),
+            deadline_seconds=query.deadline_seconds or RECOMMENDATION_DEADLINE,
+            max_distance_km=query.max_distance_km or MAX_DISTANCE_KM
         )
         return recommendations
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/metrics")
+async def get_metrics():
+    return {**metrics.snapshot(), "open_circuits": llm_circuits.open_circuits()}
+
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy"}
@@ -0,0 +1,185 @@
+"""
+Model latency/quality benchmark: replays recorded events and interest profiles through
+generate_match_rating for each model and writes a JSON (and optionally CSV) report.
+
+    python benchmark.py --output benchmark_report.json --csv benchmark_report.csv
+    LLM_BACKEND=fake python benchmark.py            # offline dry run
+    python benchmark.py --record --lat 33.76 --lon -84.39   # refresh fixtures/events.json from Meetup
+"""
+import argparse
+import contextvars
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+import event_finder
+import metrics
+from event_finder import (
+    MeetupEvent, FAILED_MATCH_SCORE, models, models_free,
+    event_from_dict, event_to_dict, find_nearby_events, generate_match_rating
+)
+from usage import track_usage
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+EVENTS_FIXTURE = os.path.join(FIXTURES_DIR, "events.json")
+INTERESTS_FIXTURE = os.path.join(FIXTURES_DIR, "interests.json")
+
+def load_fixtures(events_path: str, interests_path: str) -> tuple[list[MeetupEvent], list[str]]:
+    with open(events_path) as f:
+        events = [event_from_dict(event_dict) for event_dict in json.load(f)]
+    with open(interests_path) as f:
+        profiles = json.load(f)
+    return events, profiles
+
+def record_events(events_path: str, num_events: int, lat: float, lon: float):
+    """Save the events Meetup currently returns for a location as the benchmark corpus"""
+    events = find_nearby_events(num_events=num_events, lat=lat, lon=lon)
+    with open(events_path, "w") as f:
+        json.dump([event_to_dict(event) for event in events], f, indent=2, ensure_ascii=False)
+    print(f"Recorded {len(events)} events to {events_path}")
+
+def ranks(values: list[float]) -> list[float]:
+    """1-based ranks, ties sharing their average rank"""
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    result = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            result[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return result
+
+def spearman(a: list[float], b: list[float]) -> Optional[float]:
+    """Spearman rank correlation, None if either side is constant"""
+    ra, rb = ranks(a), ranks(b)
+    mean_a, mean_b = sum(ra) / len(ra), sum(rb) / len(rb)
+    cov = sum((x - mean_a) * (y - mean_b) for x, y in zip(ra, rb))
+    var_a = sum((x - mean_a) ** 2 for x in ra)
+    var_b = sum((y - mean_b) ** 2 for y in rb)
+    if not var_a or not var_b:
+        return None
+    return cov / (var_a * var_b) ** 0.5
+
+def percentile(samples: list[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(int(round(q / 100 * (len(samples) - 1))), len(samples) - 1)]
+
+def run_model(modelname: str, events: list[MeetupEvent], profiles: list[str], workers: int) -> dict:
+    """Score every (profile, event) pair with one model, bypassing the score cache"""
+    parse_failures_before = metrics.get_counter("score_parse_failures", model=modelname)
+
+    def score(pair):
+        profile_index, event_index = pair
+        start = time.perf_counter()
+        match_rating = generate_match_rating(events[event_index], profiles[profile_index], modelname=modelname, use_cache=False)
+        return pair, match_rating, time.perf_counter() - start
+
+    pairs = [(p, e) for p in range(len(profiles)) for e in range(len(events))]
+    with track_usage() as tracker, ThreadPoolExecutor(max_workers=workers) as pool:
+        # Each task runs in a copy of this context so the usage tracker sees its calls
+        futures = [pool.submit(contextvars.copy_context().run, score, pair) for pair in pairs]
+        results = [future.result() for future in futures]
+    usage = tracker.summary()
+
+    scores = {pair: match_rating for pair, match_rating, _ in results}
+    latencies = [latency for _, _, latency in results]
+    failed = sum(1 for match_rating in scores.values() if match_rating == FAILED_MATCH_SCORE)
+    parse_failures = metrics.get_counter("score_parse_failures", model=modelname) - parse_failures_before
+    return {
+        "model": modelname,
+        "calls": len(pairs),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+        "cost_usd": usage["cost_usd"],
+        "parse_failures": parse_failures,
+        "parse_failure_rate": parse_failures / max(usage["calls"], 1),
+        "failed_scores": failed,
+        "scores": [[scores[(p, e)] for e in range(len(events))] for p in range(len(profiles))],
+    }
+
+def rank_agreement(result: dict, reference: dict) -> Optional[float]:
+    """Mean Spearman correlation with the reference model's scores across profiles"""
+    correlations = [
+        spearman(scores, reference_scores)
+        for scores, reference_scores in zip(result["scores"], reference["scores"])
+    ]
+    correlations = [c for c in correlations if c is not None]
+    return sum(correlations) / len(correlations) if correlations else None
+
+CSV_COLUMNS = [
+    "model", "calls", "latency_p50", "latency_p95", "latency_p99", "prompt_tokens", "completion_tokens",
+    "cost_usd", "parse_failures", "parse_failure_rate", "failed_scores", "rank_agreement",
+]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scoring models over recorded events")
+    parser.add_argument("--models", nargs="+", default=models + models_free, help="Models to benchmark")
+    parser.add_argument("--reference", default=models[-1], help="Model whose ranking the others are compared with")
+    parser.add_argument("--events", default=EVENTS_FIXTURE)
+    parser.add_argument("--interests", default=INTERESTS_FIXTURE)
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent scoring calls per model")
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--csv", help="Also write a one-row-per-model CSV summary here")
+    parser.add_argument("--record", action="store_true", help="Record a fresh event corpus from Meetup and exit")
+    parser.add_argument("--lat", type=float, default=33.76)
+    parser.add_argument("--lon", type=float, default=-84.39)
+    parser.add_argument("--num-events", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.record:
+        record_events(args.events, args.num_events, args.lat, args.lon)
+        return
+
+    # Each model must answer for itself, so no failover to other models
+    event_finder.FALLBACK_CHAIN = []
+    events, profiles = load_fixtures(args.events, args.interests)
+    benchmark_models = list(dict.fromkeys([args.reference] + args.models))
+
+    results = {}
+    for modelname in benchmark_models:
+        print(f"Benchmarking {modelname} on {len(profiles)} profiles x {len(events)} events..")
+        results[modelname] = run_model(modelname, events, profiles, args.workers)
+    for result in results.values():
+        result["rank_agreement"] = rank_agreement(result, results[args.reference])
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "backend": event_finder.LLM_BACKEND,
+        "reference_model": args.reference,
+        "events_fixture": args.events,
+        "interests_fixture": args.interests,
+        "num_events": len(events),
+        "num_profiles": len(profiles),
+        "results": list(results.values()),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(results.values())
+        print(f"Wrote {args.csv}")
+
+    for result in results.values():
+        agreement = result["rank_agreement"]
+        print(f"{result['model']}: p50 {result['latency_p50']:.2f}s p95 {result['latency_p95']:.2f}s "
+              f"cost ${result['cost_usd']:.4f} parse failures {result['parse_failure_rate']:.1%} "
+              f"rank agreement {'n/a' if agreement is None else f'{agreement:.2f}'}")
+
+if __name__ == "__main__":
+    main()
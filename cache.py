@@ -0,0 +1,100 @@
+"""Disk-backed key/value cache (SQLite) with TTL expiry and size-bounded LRU eviction"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Any
+
+import metrics
+
+CACHE_PATH = os.environ.get("CACHE_PATH", "eventabot_cache.sqlite3")
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different inputs share a cache entry"""
+    return " ".join(text.lower().split())
+
+class SQLiteCache:
+    """
+    One SQLite table of JSON values. Entries older than ttl seconds are treated as misses,
+    and the least recently used entries are dropped once the table holds more than max_entries.
+    With stale_ttl, expired entries are kept that much longer so get_stale can serve them while they're refreshed.
+    Hits and misses are counted in metrics under the table name.
+    """
+    def __init__(self, table: str, ttl: float, max_entries: int, path: str = CACHE_PATH, stale_ttl: float = 0):
+        self.table = table
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )""")
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_stale(key)
+        if entry is None or entry[1]:
+            return None
+        return entry[0]
+
+    def get_stale(self, key: str) -> Optional[tuple[Any, bool]]:
+        """(value, stale) for entries younger than ttl + stale_ttl, where stale means older than ttl"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] > self.ttl + self.stale_ttl:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                row = None
+            if row:
+                self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        stale = row is not None and now - row[1] > self.ttl
+        if row is None or stale:
+            metrics.incr("cache_misses", cache=self.table)
+            if stale:
+                metrics.incr("cache_stale_hits", cache=self.table)
+        else:
+            metrics.incr("cache_hits", cache=self.table)
+        if row is None:
+            return None
+        return json.loads(row[0]), stale
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            # Drop least recently used entries beyond the size limit
+            self._conn.execute(f"""
+                DELETE FROM {self.table} WHERE key IN (
+                    SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )""", (self.max_entries,))
+
+    def age(self, key: str) -> Optional[float]:
+        """Seconds since key was last set, or None if it isn't stored. Not counted as a hit or miss."""
+        with self._lock:
+            row = self._conn.execute(f"SELECT created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return None if row is None else time.time() - row[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {
+            "entries": entries,
+            "hits": metrics.get_counter("cache_hits", cache=self.table),
+            "misses": metrics.get_counter("cache_misses", cache=self.table),
+        }
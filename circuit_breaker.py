@@ -0,0 +1,67 @@
+"""Per-model circuit breakers so a failing model stops receiving traffic for a while"""
+import threading
+import time
+
+import metrics
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for cooldown seconds.
+    After the cooldown a single trial call is let through (half-open); its outcome closes or re-opens the circuit.
+    """
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.cooldown and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    metrics.incr("circuit_opened", circuit=self.name)
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+class CircuitBreakerRegistry:
+    """Lazily created breaker per key, sharing one threshold/cooldown configuration"""
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 60):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name, self.failure_threshold, self.cooldown)
+            return self._breakers[name]
+
+    def open_circuits(self) -> list[str]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [breaker.name for breaker in breakers if breaker.is_open]
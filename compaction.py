@@ -0,0 +1,81 @@
+"""Shrinks Meetup event descriptions before they go into scoring prompts"""
+import os
+import re
+from functools import lru_cache
+
+import metrics
+
+# Max (estimated) tokens of description per event in a prompt
+DESCRIPTION_TOKEN_BUDGET = int(os.environ.get("DESCRIPTION_TOKEN_BUDGET", 200))
+# Rough chars-per-token ratio for English text, used instead of a model-specific tokenizer
+CHARS_PER_TOKEN = 4
+
+MARKDOWN_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+MARKDOWN_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+HTML_TAG = re.compile(r"<[^>]+>")
+URL = re.compile(r"(https?://|www\.)\S+", re.IGNORECASE)
+EMAIL = re.compile(r"\S+@\S+\.\w+")
+ESCAPED_CHAR = re.compile(r"\\([\\`*_{}\[\]()#+\-.!~>|])")
+MARKUP = re.compile(r"(\*\*|__|~~|`+|^\s*#+\s*|^\s*>\s*|^\s*[-*+•]\s+|^\s*\d+\.\s+)", re.MULTILINE)
+# Single *emphasis* or _emphasis_ markers, but not snake_case or a spaced-out "5 * 3"
+EMPHASIS = re.compile(r"(?<![\w*])[*_](?=\S)|(?<=\S)[*_](?![\w*])")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Sentences that are the same logistics/promo text on every event
+BOILERPLATE = re.compile(
+    r"(\brsvp\b|please (note|be aware|arrive)|follow us|like us on|join (our|us on) "
+    r"(group|mailing list|newsletter|discord|slack|whatsapp|telegram)|code of conduct|photos? (may|will) be taken|"
+    r"by (attending|rsvping)|refund|waitlist|parking|instagram|facebook|twitter|linkedin|tiktok|sponsored by|"
+    r"thank(s| you) to our sponsors?|venmo|paypal|cash ?app)",
+    re.IGNORECASE
+)
+# Everything after one of these headings is usually a host bio
+BIO_HEADING = re.compile(r"^\s*about (the |your )?(host|hosts|organi[sz]ers?|speakers?|me)\b", re.IGNORECASE)
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def compact_description(description: str, token_budget: int = DESCRIPTION_TOKEN_BUDGET) -> str:
+    """
+    Strip markup and links, drop boilerplate sentences, repeated sentences and host bios, collapse whitespace
+    and truncate to token_budget. Before/after token estimates are recorded in metrics on every call.
+    """
+    compacted = _compact_description(description or "", token_budget)
+    tokens_before, tokens_after = estimate_tokens(description or ""), estimate_tokens(compacted)
+    metrics.observe("description_tokens", tokens_before, stage="raw")
+    metrics.observe("description_tokens", tokens_after, stage="compacted")
+    metrics.incr("description_tokens_saved", tokens_before - tokens_after)
+    return compacted
+
+@lru_cache(maxsize=4096)
+def _compact_description(description: str, token_budget: int) -> str:
+    text = MARKDOWN_IMAGE.sub("", description)
+    text = MARKDOWN_LINK.sub(r"\1", text)
+    text = HTML_TAG.sub(" ", text)
+    text = URL.sub("", text)
+    text = EMAIL.sub("", text)
+    text = ESCAPED_CHAR.sub(r"\1", text)
+    text = MARKUP.sub("", text)
+    text = EMPHASIS.sub("", text)
+
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    kept_sentences = []
+    seen = set()
+    for line in lines:
+        if BIO_HEADING.match(line):
+            break
+        for sentence in SENTENCE_END.split(line):
+            if not sentence or BOILERPLATE.search(sentence) or sentence.lower() in seen:
+                continue
+            seen.add(sentence.lower())
+            kept_sentences.append(sentence)
+    # Everything matched as boilerplate: a truncated description beats an empty one
+    compacted = " ".join(kept_sentences) or " ".join(line for line in lines if line)
+    return truncate(compacted, token_budget)
+
+def truncate(text: str, token_budget: int) -> str:
+    """text cut at a word boundary to about token_budget tokens"""
+    max_chars = token_budget * CHARS_PER_TOKEN
+    if len(text) > max_chars:
+        text = text[:max_chars - 3].rsplit(" ", 1)[0] + "..."
+    return text
@@ -0,0 +1,25 @@
+"""Request-level time budget passed down to fetching and scoring"""
+import time
+from typing import Optional
+
+class Deadline:
+    """Absolute point in time a request has to finish by; seconds=None means no limit"""
+    def __init__(self, seconds: Optional[float]):
+        self.seconds = seconds
+        self._expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), or None without a limit"""
+        if self._expires_at is None:
+            return None
+        return max(self._expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def timeout(self, default: float) -> float:
+        """default capped by the time left, for use as a per-call timeout"""
+        remaining = self.remaining()
+        return default if remaining is None else min(default, remaining)
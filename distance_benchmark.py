@@ -0,0 +1,32 @@
+"""Micro-benchmark: scalar calculate_distance loop vs vectorized calculate_distances"""
+import argparse
+import random
+import timeit
+
+import numpy as np
+
+from event_finder import calculate_distance, calculate_distances
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="Comma-separated numbers of venues")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per size; the best one is reported")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    lat, lon = 33.76, -84.39
+    print(f"{'venues':>8} {'scalar ms':>10} {'numpy ms':>10} {'speedup':>8}")
+    for size in (int(x) for x in args.sizes.split(",")):
+        lats = [lat + rng.uniform(-0.5, 0.5) for _ in range(size)]
+        lons = [lon + rng.uniform(-0.5, 0.5) for _ in range(size)]
+        scalar = lambda: [calculate_distance(lat, lon, venue_lat, venue_lon) for venue_lat, venue_lon in zip(lats, lons)]
+        vectorized = lambda: calculate_distances(lat, lon, lats, lons)
+        assert np.allclose(scalar(), vectorized())
+
+        number = max(1, 20000 // size)
+        scalar_ms = min(timeit.repeat(scalar, number=number, repeat=args.repeat)) / number * 1000
+        vectorized_ms = min(timeit.repeat(vectorized, number=number, repeat=args.repeat)) / number * 1000
+        print(f"{size:>8} {scalar_ms:>10.3f} {vectorized_ms:>10.3f} {scalar_ms / vectorized_ms:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Local SQLite store of every Meetup event seen, upserted by event URL on each fetch"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from math import cos, radians
+from typing import Any, Iterable, Optional
+
+import metrics
+
+EVENT_STORE_PATH = os.environ.get("EVENT_STORE_PATH", "eventabot_events.sqlite3")
+# Events not seen in a fetch for this many seconds are dropped
+EVENT_STORE_RETENTION = float(os.environ.get("EVENT_STORE_RETENTION", 30 * 24 * 3600))
+
+class EventStore:
+    """
+    Events keyed by eventLink, stored as event_to_dict JSON along with a content hash and when they were
+    first seen, last seen and last changed. WAL mode lets readers query while a fetch is writing.
+    """
+    def __init__(self, path: str = EVENT_STORE_PATH, retention: float = EVENT_STORE_RETENTION):
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    event_link TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    latitude REAL,
+                    longitude REAL,
+                    starts_at REAL NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    changed_at REAL NOT NULL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS events_location ON events (latitude, longitude)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS events_last_seen ON events (last_seen)")
+
+    def upsert(self, events: Iterable[tuple[str, dict]]) -> dict[str, int]:
+        """
+        Sync (content_hash, event dict) pairs into the store. Unchanged events only get last_seen bumped.
+        Returns how many events were new, changed and unchanged.
+        """
+        now = time.time()
+        counts = {"new": 0, "changed": 0, "unchanged": 0}
+        with self._lock, self._conn:
+            for content_hash, event in events:
+                row = self._conn.execute(
+                    "SELECT content_hash FROM events WHERE event_link = ?", (event["eventLink"],)
+                ).fetchone()
+                if row and row[0] == content_hash:
+                    self._conn.execute("UPDATE events SET last_seen = ? WHERE event_link = ?", (now, event["eventLink"]))
+                    counts["unchanged"] += 1
+                    continue
+                self._conn.execute("""
+                    INSERT INTO events (event_link, data, content_hash, latitude, longitude, starts_at, first_seen, last_seen, changed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (event_link) DO UPDATE SET
+                        data = excluded.data,
+                        content_hash = excluded.content_hash,
+                        latitude = excluded.latitude,
+                        longitude = excluded.longitude,
+                        starts_at = excluded.starts_at,
+                        last_seen = excluded.last_seen,
+                        changed_at = excluded.changed_at""", (
+                    event["eventLink"],
+                    json.dumps({**event, "distance": None, "matchScore": None}),
+                    content_hash,
+                    event.get("latitude"),
+                    event.get("longitude"),
+                    datetime.fromisoformat(event["datetime"]).timestamp(),
+                    now, now, now
+                ))
+                counts["changed" if row else "new"] += 1
+            if now - self._pruned_at > 3600:
+                self._conn.execute("DELETE FROM events WHERE last_seen < ?", (now - self.retention,))
+                self._pruned_at = now
+        for status, count in counts.items():
+            metrics.incr("event_store_upserts", count, status=status)
+        return counts
+
+    def near(self, lat: float, lon: float, radius_km: float, limit: int, starts_after: Optional[float] = None) -> list[dict]:
+        """
+        Up to limit stored events within a radius_km box around (lat, lon) that start after starts_after
+        (default now), soonest first. Events without a venue are left out.
+        """
+        dlat = radius_km / 111.32
+        dlon = radius_km / max(111.32 * cos(radians(lat)), 1e-6)
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT data FROM events
+                WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ? AND starts_at >= ?
+                ORDER BY starts_at LIMIT ?""",
+                (lat - dlat, lat + dlat, lon - dlon, lon + dlon, time.time() if starts_after is None else starts_after, limit)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        return {
+            "entries": entries,
+            **{status: metrics.get_counter("event_store_upserts", status=status) for status in ("new", "changed", "unchanged")}
+        }
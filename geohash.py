@@ -0,0 +1,41 @@
+"""Geohash encoding, used to snap nearby coordinates onto shared cache tiles"""
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def encode(lat: float, lon: float, precision: int = 5) -> str:
+    """Geohash of the cell containing (lat, lon). Precision 5 cells are about 4.9 x 4.9 km, 6 about 1.2 x 0.6 km."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, starting with longitude
+        value, value_range = (lon, lon_range) if even else (lat, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            value_range[0] = mid
+        else:
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+def decode(geohash: str) -> tuple[float, float]:
+    """Center (lat, lon) of a geohash cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            value_range = lon_range if even else lat_range
+            mid = (value_range[0] + value_range[1]) / 2
+            if bits >> shift & 1:
+                value_range[0] = mid
+            else:
+                value_range[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
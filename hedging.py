@@ -0,0 +1,87 @@
+"""Hedged calls: send a duplicate when the first call is slower than usual and take whichever answers first"""
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError, wait
+from typing import Callable, Optional, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+
+# Runs both the original and the hedge so the caller can wait on either. Losers finish in the background.
+# Time spent queued here doesn't count towards hedge_after, see hedged_call.
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+
+class HedgeBudget:
+    """
+    Caps hedges at max_rate of the hedge-eligible calls made in the last window seconds, so hedging can't
+    double upstream usage and a quiet period can't bank hedges for a later slowdown
+    """
+    def __init__(self, max_rate: float, window: float = 60):
+        self.max_rate = max_rate
+        self.window = window
+        self._calls = deque()
+        self._hedges = deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        for times in (self._calls, self._hedges):
+            while times and now - times[0] > self.window:
+                times.popleft()
+
+    def record_call(self):
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            self._calls.append(now)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            if len(self._hedges) + 1 > self.max_rate * len(self._calls):
+                return False
+            self._hedges.append(now)
+            return True
+
+def _submit(fn: Callable[[], T]):
+    # Copy the caller's context so per-request usage tracking still sees these calls
+    return _executor.submit(contextvars.copy_context().run, fn)
+
+def hedged_call(primary: Callable[[], Optional[T]], hedge: Callable[[], Optional[T]], hedge_after: float, budget: HedgeBudget) -> Optional[T]:
+    """
+    Run primary; if it hasn't finished hedge_after seconds after it started and the budget allows, also run hedge.
+    Returns the first non-None result (None if both fail).
+    """
+    budget.record_call()
+    started = threading.Event()
+
+    def run_primary():
+        started.set()
+        return primary()
+
+    first = _submit(run_primary)
+    # Measure hedge_after from when the call starts running, so a busy executor doesn't make primaries look slow
+    started.wait()
+    try:
+        return first.result(timeout=hedge_after)
+    except TimeoutError:
+        pass
+    if not budget.try_acquire():
+        metrics.incr("llm_hedges_skipped")
+        return first.result()
+
+    metrics.incr("llm_hedges")
+    second = _submit(hedge)
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            result = future.result()
+            if result is not None:
+                if future is second:
+                    metrics.incr("llm_hedge_wins")
+                return result
+    return None
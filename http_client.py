@@ -0,0 +1,33 @@
+"""Shared keep-alive HTTP session used for all OpenRouter and Meetup calls"""
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Max pooled connections kept open per host; should be at least the scoring concurrency
+POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 16))
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 60))
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Process-wide session, created on first use. Connections are reused across calls and threads."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, pool_block=True)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["Connection"] = "keep-alive"
+                _session = session
+    return _session
+
+def post(url: str, timeout=None, **kwargs) -> requests.Response:
+    """requests.post over the pooled session, with (connect, read) timeouts applied by default"""
+    return get_session().post(url, timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs)
@@ -0,0 +1,50 @@
+"""Local prompt-injection heuristics, so check_injection only needs the LLM for ambiguous inputs"""
+import re
+from typing import Optional
+
+# Longest input that can be cleared without the LLM
+MAX_BENIGN_LENGTH = 500
+
+# Phrases that only show up when someone is trying to steer the model
+ATTACK_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    r"\b(ignore|disregard|forget|override|bypass)\s+(all\s+|any\s+|the\s+|your\s+)*(previous|prior|above|earlier|preceding)\s+(instructions?|prompts?)\b",
+    r"\+\+\+",
+    r"<\|?(im_start|im_end|system|endoftext)\|?>",
+]]
+
+# Phrases attacks use that also turn up in earnest interests ("improv where we act as a team"); the LLM decides these
+AMBIGUOUS_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    r"\b(ignore|disregard|forget|override|bypass)\b.{0,40}\b(instructions?|prompts?)\b",
+    r"\b(ignore|disregard|forget|override|bypass)\b.{0,40}\b(rules|directions|context|task|guidelines)\b",
+    r"\b(new|updated|real|actual)\s+instructions?\b",
+    r"\bsystem\s+prompt\b",
+    r"\b(activation|override|admin|developer)\s+(code|mode)\b",
+    r"\bjailbreak",
+    r"\byou\s+are\s+now\b",
+    r"\bfrom\s+now\s+on\b",
+    r"\bpretend\s+(to\s+be|you\s+are)\b",
+    r"\b(act|behave)\s+as\s+(if|an?|the)\b",
+    r"\b(give|rate|score|assign)\b.{0,40}\b100\b",
+    r"\b(respond|reply|answer|output)\s+(only\s+)?with\b",
+    r"^\s*(system|assistant|human|user)\s*:",
+]]
+
+# Words an earnest description of interests has no reason to use
+SUSPICIOUS_WORDS = re.compile(
+    r"\b(you|your|instructions?|prompts?|ignore|disregard|forget|model|ai|assistant|llm|gpt|chatgpt|"
+    r"answer|reply|respond|say|output|print|score|rating|rate|true|false|code|task|command|rules?)\b",
+    re.IGNORECASE
+)
+BENIGN_CHARACTERS = re.compile(r"^[\w\s,.;:'\"!?()/&\-]*$")
+
+def classify_injection(user_input: str) -> Optional[bool]:
+    """True for an obvious injection attempt, False for obviously benign text, None when the LLM should decide"""
+    if any(pattern.search(user_input) for pattern in ATTACK_PATTERNS):
+        return True
+    if any(pattern.search(user_input) for pattern in AMBIGUOUS_PATTERNS):
+        return None
+    if (len(user_input) <= MAX_BENIGN_LENGTH
+            and BENIGN_CHARACTERS.match(user_input)
+            and not SUSPICIOUS_WORDS.search(user_input)):
+        return False
+    return None
@@ -0,0 +1,293 @@
+"""LLM backends behind llm_request: OpenRouter, any OpenAI-compatible server and a deterministic in-process fake"""
+import abc
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+import requests
+
+import http_client
+import metrics
+from compaction import estimate_tokens
+from rate_limit import TokenBucket, backoff_delay, retry_after_seconds
+from usage import record_usage
+
+# Which backend serves llm_request: "openrouter", "local" or "fake"
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "openrouter")
+
+OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_MAX_ATTEMPTS = int(os.environ.get("OPENROUTER_MAX_ATTEMPTS", 5))
+# Longest Retry-After/X-RateLimit-Reset wait honored. Longer ones (e.g. a model's daily quota) fail the call so failover takes over.
+LLM_MAX_RETRY_AFTER = float(os.environ.get("LLM_MAX_RETRY_AFTER", 30))
+# Shared by every thread in the process: average requests/second and burst size
+openrouter_limiter = TokenBucket(
+    rate=float(os.environ.get("OPENROUTER_RATE_LIMIT", 5)),
+    capacity=float(os.environ.get("OPENROUTER_BURST", 10))
+)
+
+# OpenAI-compatible local server (e.g. ollama's /v1/chat/completions). LOCAL_LLM_MODEL serves every requested model name.
+LOCAL_LLM_URL = os.environ.get("LOCAL_LLM_URL")
+LOCAL_LLM_MODEL = os.environ.get("LOCAL_LLM_MODEL", "llama3.2")
+
+# Fake backend: mean latency in seconds (exponentially distributed), share of calls that fail, RNG seed
+FAKE_LLM_LATENCY = float(os.environ.get("FAKE_LLM_LATENCY", 0.5))
+FAKE_LLM_ERROR_RATE = float(os.environ.get("FAKE_LLM_ERROR_RATE", 0.0))
+FAKE_LLM_SEED = int(os.environ.get("FAKE_LLM_SEED", 0))
+
+def read_sse_stream(response, stream_until: Callable[[str], bool]) -> tuple[str, Optional[dict]]:
+    """
+    Accumulate SSE content deltas, closing the stream as soon as stream_until(text so far) is true.
+    Returns the text and the usage block, which is only sent in the last chunk.
+    """
+    response_text = ""
+    usage = None
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"): # blank separators and ": OPENROUTER PROCESSING" comments
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            if not isinstance(chunk, dict) or "error" in chunk:
+                print(f"Stream error: {chunk}")
+                break
+            usage = chunk.get("usage") or usage
+            choices = chunk.get("choices") or [{}]
+            response_text += (choices[0].get("delta") or {}).get("content") or ""
+            if stream_until(response_text):
+                break
+    finally:
+        response.close()
+    return response_text, usage
+
+def record_call_usage(modelname: str, prompt: str, response_text: str, usage: Optional[dict], latency: float):
+    """Account for a completed call, estimating tokens from text length when the usage block is missing (e.g. a cut-off stream)"""
+    usage = usage or {}
+    record_usage(
+        modelname,
+        prompt_tokens=usage.get("prompt_tokens", estimate_tokens(prompt)),
+        completion_tokens=usage.get("completion_tokens", estimate_tokens(response_text)),
+        latency=latency,
+        cost=usage.get("cost")
+    )
+
+def completion_text(response_data) -> Optional[str]:
+    """Message content of a chat completion body, or None when the body isn't shaped like one"""
+    try:
+        content = response_data["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return content if isinstance(content, str) else None
+
+def error_headers(response_data) -> dict:
+    """Upstream rate limit headers that OpenRouter passes inside an error body, if any"""
+    try:
+        headers = response_data["error"]["metadata"]["headers"]
+    except (KeyError, IndexError, TypeError):
+        return {}
+    return headers if isinstance(headers, dict) else {}
+
+class LLMBackend(abc.ABC):
+    """Turns a prompt into completion text for a model name. complete() returns None when the call failed."""
+    name = "base"
+
+    @abc.abstractmethod
+    def complete(
+        self,
+        prompt: str,
+        modelname: str,
+        response_format: Optional[dict] = None,
+        stream_until: Optional[Callable[[str], bool]] = None,
+        max_attempts: Optional[int] = None
+    ) -> Optional[str]:
+        ...
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Any server speaking the OpenAI chat completions API. Retries with jittered backoff that honors
+    Retry-After/X-RateLimit-Reset, optionally through a shared rate limiter.
+    With stream_until the reply is streamed and cut off once stream_until(text so far) returns True.
+    """
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        api_key: Optional[str] = None,
+        limiter: Optional[TokenBucket] = None,
+        model_override: Optional[str] = None,
+        extra_body: Optional[dict] = None,
+        max_attempts: int = OPENROUTER_MAX_ATTEMPTS
+    ):
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.limiter = limiter
+        self.model_override = model_override
+        self.extra_body = extra_body or {}
+        self.max_attempts = max_attempts
+
+    def complete(self, prompt, modelname, response_format=None, stream_until=None, max_attempts=None):
+        modelname = self.model_override or modelname
+        max_attempts = max_attempts or self.max_attempts
+        delay = 0
+        for attempt in range(max_attempts):
+            if attempt:
+                metrics.incr("llm_retries", backend=self.name, model=modelname)
+                time.sleep(delay)
+            if self.limiter:
+                self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = http_client.post(
+                    url=self.url,
+                    headers={
+                        "Authorization": f"Bearer {self.api_key}",
+                    } if self.api_key else {},
+                    data=json.dumps({
+                        "model": modelname,
+                        "messages": [
+                        {
+                            "role": "user",
+                            "content": [
+                            {
+                                "type": "text",
+                                "text": prompt
+                            },
+                            #   {
+                            #     "type": "image_url",
+                            #     "image_url": {
+                            #       "url": "https://upload.wikimedia.org/wikipedia/commons/thumb/d/dd/Gfp-wisconsin-madison-the-nature-boardwalk.jpg/2560px-Gfp-wisconsin-madison-the-nature-boardwalk.jpg"
+                            #     }
+                            #   }
+                            ]
+                        }
+                        ],
+                        **({"response_format": response_format} if response_format else {}),
+                        **({"stream": True} if stream_until else {}),
+                        **self.extra_body
+                    }),
+                    stream=bool(stream_until)
+                )
+                if stream_until and response.ok:
+                    response_text, usage = read_sse_stream(response, stream_until)
+                    record_call_usage(modelname, prompt, response_text, usage, time.perf_counter() - start)
+                    return response_text
+                response_data = response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Error making request to {self.name}: {e}")
+                delay = backoff_delay(attempt)
+                continue
+            response_text = completion_text(response_data)
+            if response_text is not None:
+                record_call_usage(modelname, prompt, response_text, response_data.get("usage"), time.perf_counter() - start)
+                return response_text
+            else: # Probably API rate limiting, otherwise a malformed body; either way a failed attempt
+                print(response_data)
+                global_retry_after = retry_after_seconds(response.headers)
+                # Upstream headers in the error body are that model's own limit
+                retry_after = global_retry_after if global_retry_after is not None else retry_after_seconds(error_headers(response_data))
+                if retry_after is not None and retry_after > LLM_MAX_RETRY_AFTER:
+                    print(f"{modelname} on {self.name} asked to wait {retry_after:.0f}s, giving up on it")
+                    metrics.incr("llm_long_retry_after", backend=self.name, model=modelname)
+                    break
+                # Only a short process-wide limit holds back every caller
+                if global_retry_after is not None and self.limiter:
+                    self.limiter.pause(global_retry_after)
+                delay = backoff_delay(attempt, cap=LLM_MAX_RETRY_AFTER, retry_after=retry_after)
+                print(f"API rate limited, retrying in {delay:.1f}s..")
+        print(f"Failed to get response from {modelname} on {self.name} after {attempt + 1} attempts.")
+        metrics.incr("llm_failures", backend=self.name, model=modelname)
+        return None
+
+class OpenRouterBackend(OpenAICompatibleBackend):
+    """OpenRouter, with the process-wide rate limiter and its usage/cost reporting turned on"""
+    def __init__(self):
+        if not OPENROUTER_API_KEY:
+            raise RuntimeError("OPENROUTER_API_KEY is not set")
+        super().__init__(
+            "openrouter",
+            OPENROUTER_URL,
+            api_key=OPENROUTER_API_KEY,
+            limiter=openrouter_limiter,
+            extra_body={"usage": {"include": True}}
+        )
+
+class FakeBackend(LLMBackend):
+    """
+    Offline stand-in for load tests and benchmarks. Replies are a pure function of (model, prompt) and are
+    shaped like what each of our prompts asks for (JSON score, labelled batch scores, rubric, injection verdict).
+    Latency and failures are drawn from a seeded RNG.
+    """
+    name = "fake"
+
+    def __init__(self, latency: float = FAKE_LLM_LATENCY, error_rate: float = FAKE_LLM_ERROR_RATE, seed: int = FAKE_LLM_SEED):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _score(*parts: str) -> int:
+        return int(hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest(), 16) % 101
+
+    def _reply(self, prompt: str, modelname: str) -> str:
+        labels = re.findall(r"^\s*\[(\d+)\]\s*$", prompt, re.MULTILINE)
+        if labels:
+            blocks = re.split(r"^\s*\[\d+\]\s*$", prompt, flags=re.MULTILINE)[1:]
+            return "\n".join(f"[{label}] {{{self._score(modelname, block)}}}" for label, block in zip(labels, blocks))
+        if '"score"' in prompt:
+            reply = {"reasoning": "Fake backend rating.", "score": self._score(modelname, prompt)}
+            if prompt.index('"score"') < prompt.index('"reasoning"'): # Score-first streaming format
+                reply = {"score": reply["score"], "reasoning": reply["reasoning"]}
+            return json.dumps(reply)
+        if '"rubric"' in prompt:
+            interests = re.search(r"User interests: '(.*?)'", prompt, re.DOTALL)
+            keywords = sorted(set(re.findall(r"[a-z]{4,}", (interests.group(1) if interests else "").lower())))[:10]
+            return json.dumps({"rubric": "Events about the listed keywords are strong matches.", "keywords": keywords})
+        return "Fake backend reasoning.\nfalse"
+
+    def complete(self, prompt, modelname, response_format=None, stream_until=None, max_attempts=None):
+        with self._lock:
+            latency = self._rng.expovariate(1 / self.latency) if self.latency > 0 else 0
+            failed = self._rng.random() < self.error_rate
+        time.sleep(latency)
+        if failed:
+            metrics.incr("llm_failures", backend=self.name, model=modelname)
+            return None
+        response_text = self._reply(prompt, modelname)
+        if stream_until:
+            streamed = ""
+            for i in range(0, len(response_text), 4):
+                streamed += response_text[i:i + 4]
+                if stream_until(streamed):
+                    break
+            response_text = streamed
+        record_usage(modelname, estimate_tokens(prompt), estimate_tokens(response_text), latency, cost=0.0)
+        return response_text
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(name: str = None) -> LLMBackend:
+    """Backend instance by name (default LLM_BACKEND), created on first use"""
+    name = name or LLM_BACKEND
+    with _backends_lock:
+        if name not in _backends:
+            if name == "openrouter":
+                _backends[name] = OpenRouterBackend()
+            elif name == "local":
+                if not LOCAL_LLM_URL:
+                    raise RuntimeError("LOCAL_LLM_URL is not set")
+                _backends[name] = OpenAICompatibleBackend("local", LOCAL_LLM_URL, model_override=LOCAL_LLM_MODEL)
+            elif name == "fake":
+                _backends[name] = FakeBackend()
+            else:
+                raise ValueError(f"Unknown LLM backend: {name}")
+        return _backends[name]
@@ -0,0 +1,73 @@
+"""Process-wide counters and latency samples, exposed by the /api/metrics endpoint"""
+import threading
+from collections import defaultdict, deque
+from typing import Optional, Dict, Any
+
+# Number of most recent samples kept per summary for percentile estimates
+MAX_SAMPLES = 1000
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+def _key(name: str, labels: Dict[str, Any]) -> str:
+    """Prometheus-style series name, e.g. cache_hits{cache="match_scores"}"""
+    if not labels:
+        return name
+    label_str = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+def incr(name: str, amount: float = 1, **labels):
+    """Add amount to a counter"""
+    with _lock:
+        _counters[_key(name, labels)] += amount
+
+def observe(name: str, value: float, **labels):
+    """Record a sample (latency, token count, ...) for a summary"""
+    with _lock:
+        _samples[_key(name, labels)].append(value)
+
+def get_counter(name: str, **labels) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+def sample_count(name: str, **labels) -> int:
+    """Number of recent samples held for a summary (at most MAX_SAMPLES)"""
+    with _lock:
+        return len(_samples.get(_key(name, labels), ()))
+
+def percentile(name: str, q: float, **labels) -> Optional[float]:
+    """q-th percentile (0-100) of recent samples, or None if nothing was recorded yet"""
+    with _lock:
+        samples = sorted(_samples.get(_key(name, labels), ()))
+    if not samples:
+        return None
+    index = min(int(round(q / 100 * (len(samples) - 1))), len(samples) - 1)
+    return samples[index]
+
+def _summarize(samples: list) -> Dict[str, float]:
+    samples = sorted(samples)
+    def pick(q):
+        return samples[min(int(round(q / 100 * (len(samples) - 1))), len(samples) - 1)]
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples),
+        "p50": pick(50),
+        "p95": pick(95),
+        "p99": pick(99),
+    }
+
+def snapshot() -> Dict[str, Any]:
+    """All counters plus count/mean/p50/p95/p99 of every summary"""
+    with _lock:
+        counters = dict(_counters)
+        samples = {key: list(values) for key, values in _samples.items() if values}
+    return {
+        "counters": counters,
+        "summaries": {key: _summarize(values) for key, values in samples.items()},
+    }
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _samples.clear()
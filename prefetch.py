@@ -0,0 +1,118 @@
+"""Background prefetching: keep the most requested locations warm so their first request of the hour isn't a cold fetch"""
+import os
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional
+
+import metrics
+from rate_limit import TokenBucket
+
+# Run the scheduler inside the API process
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+# Seconds between scheduler passes
+PREFETCH_INTERVAL = float(os.environ.get("PREFETCH_INTERVAL", 60))
+# Number of hottest locations considered on each pass
+PREFETCH_TOP_N = int(os.environ.get("PREFETCH_TOP_N", 20))
+# Locations need at least this many recent (decayed) requests to be prefetched
+PREFETCH_MIN_REQUESTS = float(os.environ.get("PREFETCH_MIN_REQUESTS", 2))
+# Half-life in seconds of a location's request count
+PREFETCH_HALF_LIFE = float(os.environ.get("PREFETCH_HALF_LIFE", 3600))
+# Max prefetches per hour; a burst of up to PREFETCH_TOP_N is allowed
+PREFETCH_BUDGET = float(os.environ.get("PREFETCH_BUDGET", 120))
+
+class HotLocations:
+    """
+    Request counts per key with exponential decay, so recently busy locations rank first.
+    Each key also keeps the info passed with its last request (e.g. how many events were asked for).
+    """
+    def __init__(self, half_life: float = PREFETCH_HALF_LIFE, max_keys: int = 10000):
+        self.half_life = half_life
+        self.max_keys = max_keys
+        self._counts: dict[Hashable, tuple[float, float]] = {}
+        self._info: dict[Hashable, dict] = {}
+        self._lock = threading.Lock()
+
+    def _decayed(self, count: float, updated: float, now: float) -> float:
+        return count * 0.5 ** ((now - updated) / self.half_life)
+
+    def record(self, key: Hashable, **info: Any):
+        now = time.time()
+        with self._lock:
+            count, updated = self._counts.get(key, (0.0, now))
+            self._counts[key] = (self._decayed(count, updated, now) + 1, now)
+            self._info[key] = info
+            if len(self._counts) > self.max_keys:
+                # Forget the coldest tenth
+                ranked = sorted(self._counts, key=lambda k: self._decayed(*self._counts[k], now))
+                for cold in ranked[:max(len(ranked) // 10, 1)]:
+                    del self._counts[cold]
+                    del self._info[cold]
+
+    def top(self, n: int, min_count: float = 0) -> list[tuple[Hashable, float, dict]]:
+        """Up to n (key, decayed count, info) tuples, busiest first"""
+        now = time.time()
+        with self._lock:
+            ranked = [(key, self._decayed(count, updated, now), self._info[key]) for key, (count, updated) in self._counts.items()]
+        ranked = [entry for entry in ranked if entry[1] >= min_count]
+        ranked.sort(key=lambda entry: entry[1], reverse=True)
+        return ranked[:n]
+
+class PrefetchScheduler:
+    """
+    Every interval seconds, calls refresh(key, info) for the hottest keys that needs_refresh(key),
+    spending one budget token per refresh and skipping the rest of the pass once the budget is used up.
+    """
+    def __init__(
+        self,
+        hot: HotLocations,
+        refresh: Callable[[Hashable, dict], None],
+        needs_refresh: Callable[[Hashable], bool],
+        budget: Optional[TokenBucket] = None,
+        interval: float = PREFETCH_INTERVAL,
+        top_n: int = PREFETCH_TOP_N,
+        min_requests: float = PREFETCH_MIN_REQUESTS
+    ):
+        self.hot = hot
+        self.refresh = refresh
+        self.needs_refresh = needs_refresh
+        self.budget = budget or TokenBucket(rate=PREFETCH_BUDGET / 3600, capacity=max(top_n, 1))
+        self.interval = interval
+        self.top_n = top_n
+        self.min_requests = min_requests
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self) -> int:
+        """One scheduler pass. Returns the number of refreshes started."""
+        refreshed = 0
+        for key, _, info in self.hot.top(self.top_n, self.min_requests):
+            if not self.needs_refresh(key):
+                continue
+            if not self.budget.try_acquire():
+                metrics.incr("prefetch_skipped", reason="budget")
+                break
+            try:
+                self.refresh(key, info)
+            except Exception as e:
+                print(f"Prefetch of {key} failed: {e}")
+                metrics.incr("prefetch_failures")
+                continue
+            metrics.incr("prefetch_refreshes")
+            refreshed += 1
+        return refreshed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,70 @@
+"""CPU-only BM25 pre-ranking of events against the interests text, run before LLM scoring"""
+import math
+import re
+from collections import Counter
+
+# Standard Okapi BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# Highest heuristic score given to events that skip the LLM, so they rank below strong LLM matches
+HEURISTIC_MAX_SCORE = 40
+
+STOPWORDS = {
+    "a", "about", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "good", "have", "i", "i'm",
+    "im", "in", "interested", "into", "is", "it", "like", "love", "me", "my", "of", "on", "or", "our", "so",
+    "that", "the", "their", "this", "to", "us", "we", "will", "with", "you", "your",
+}
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens without stopwords, with a plural 's' stripped"""
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+def bm25_scores(documents: list[str], query: str) -> list[float]:
+    """BM25 relevance of each document to the query"""
+    doc_tokens = [Counter(tokenize(doc)) for doc in documents]
+    if not doc_tokens:
+        return []
+    doc_lengths = [sum(tokens.values()) for tokens in doc_tokens]
+    avg_length = sum(doc_lengths) / len(doc_lengths) or 1
+    doc_freq = Counter(term for tokens in doc_tokens for term in tokens)
+    n_docs = len(documents)
+
+    scores = []
+    for tokens, length in zip(doc_tokens, doc_lengths):
+        score = 0.0
+        for term in set(tokenize(query)):
+            freq = tokens.get(term, 0)
+            if not freq:
+                continue
+            idf = math.log(1 + (n_docs - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            score += idf * freq * (K1 + 1) / (freq + K1 * (1 - B + B * length / avg_length))
+        scores.append(score)
+    return scores
+
+def heuristic_score(bm25: float, best_bm25: float) -> int:
+    """Map a BM25 score onto 0-HEURISTIC_MAX_SCORE relative to the best event in the request"""
+    if best_bm25 <= 0:
+        return 0
+    return round(HEURISTIC_MAX_SCORE * bm25 / best_bm25)
+
+def prerank_events(events: list, interests: str, top_k: int) -> tuple[list, list]:
+    """
+    Split events into the top_k lexical matches for the interests, which should go to the LLM,
+    and the rest, which get a heuristic matchScore straight away.
+    """
+    scores = bm25_scores([f"{event.name} {event.name} {event.description}" for event in events], interests)
+    order = sorted(range(len(events)), key=lambda i: scores[i], reverse=True)
+    best = scores[order[0]] if order else 0
+    rest = []
+    for i in order[top_k:]:
+        events[i].matchScore = heuristic_score(scores[i], best)
+        rest.append(events[i])
+    return [events[i] for i in order[:top_k]], rest
@@ -0,0 +1,89 @@
+"""Process-wide token bucket and retry backoff helpers for upstream APIs"""
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, Mapping
+
+class TokenBucket:
+    """
+    Allows `rate` calls per second on average with bursts of up to `capacity`.
+    acquire() blocks until a token is free and try_acquire() takes one only if it's free now. pause() stops every caller until a
+    server-provided reset time, so one Retry-After holds back the whole process.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._refill()
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = self._refill()
+            if now >= self._paused_until and self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0, retry_after: Optional[float] = None) -> float:
+    """Exponential backoff with full jitter, never shorter than a server-provided retry_after; never longer than cap"""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
+
+def _header(headers: Mapping[str, str], name: str) -> Optional[str]:
+    for key, value in headers.items():
+        if key.lower() == name.lower():
+            return str(value)
+    return None
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Seconds to wait according to Retry-After (delta seconds or HTTP date) or,
+    when the quota is used up, X-RateLimit-Reset (epoch milliseconds, as sent by OpenRouter).
+    """
+    retry_after = _header(headers, "Retry-After")
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            try:
+                return max((parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+            except (TypeError, ValueError):
+                pass
+
+    remaining = _header(headers, "X-RateLimit-Remaining")
+    reset = _header(headers, "X-RateLimit-Reset")
+    if reset and remaining is not None and remaining.strip() in ("0", "0.0"):
+        try:
+            reset_at = float(reset)
+        except ValueError:
+            return None
+        if reset_at > 1e11:  # milliseconds since epoch
+            reset_at /= 1000
+        return max(reset_at - time.time(), 0.0)
+    return None
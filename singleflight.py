@@ -0,0 +1,43 @@
+"""Single-flight coalescing: concurrent calls with the same key share one execution and its result"""
+import threading
+from typing import Any, Callable, Hashable
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        """
+        Run fn unless a call with the same key is already in flight, in which case wait for that one.
+        Returns (result, shared), where shared is True for callers that reused another call's result.
+        Exceptions from fn are raised in every waiting caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
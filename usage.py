@@ -0,0 +1,73 @@
+"""Token, latency and cost accounting for LLM calls, per recommendation request and process-wide"""
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any
+
+import metrics
+
+# USD per million (prompt, completion) tokens, used when OpenRouter doesn't report the cost itself
+MODEL_PRICES = {
+    "amazon/nova-micro-v1": (0.035, 0.14),
+    "amazon/nova-lite-v1": (0.06, 0.24),
+    "meta-llama/llama-3.3-70b-instruct": (0.12, 0.30),
+    "google/gemini-2.0-flash-exp:free": (0.0, 0.0),
+    "meta-llama/llama-3.1-70b-instruct:free": (0.0, 0.0),
+    "meta-llama/llama-3.2-90b-vision-instruct:free": (0.0, 0.0),
+}
+
+def estimate_cost(modelname: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(modelname, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+class UsageTracker:
+    """Per-model totals of the LLM calls made while handling one request"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_model: Dict[str, Dict[str, float]] = {}
+
+    def record(self, modelname: str, prompt_tokens: int, completion_tokens: int, latency: float, cost: float):
+        with self._lock:
+            totals = self._by_model.setdefault(modelname, {
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_seconds": 0.0, "cost_usd": 0.0
+            })
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["latency_seconds"] += latency
+            totals["cost_usd"] += cost
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            by_model = {modelname: dict(totals) for modelname, totals in self._by_model.items()}
+        total = {key: sum(totals[key] for totals in by_model.values())
+                 for key in ("calls", "prompt_tokens", "completion_tokens", "latency_seconds", "cost_usd")}
+        return {**total, "by_model": by_model}
+
+_current_tracker: contextvars.ContextVar[Optional[UsageTracker]] = contextvars.ContextVar("usage_tracker", default=None)
+
+@contextmanager
+def track_usage():
+    """
+    Collect usage of every LLM call made inside the block. Worker threads only see the tracker
+    if their task runs in a copy of this context (contextvars.copy_context().run).
+    """
+    tracker = UsageTracker()
+    token = _current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_tracker.reset(token)
+
+def record_usage(modelname: str, prompt_tokens: int, completion_tokens: int, latency: float, cost: Optional[float] = None):
+    """Add one call to the process-wide metrics and to the current request's tracker, if any"""
+    if cost is None:
+        cost = estimate_cost(modelname, prompt_tokens, completion_tokens)
+    metrics.incr("llm_calls", model=modelname)
+    metrics.incr("llm_prompt_tokens", prompt_tokens, model=modelname)
+    metrics.incr("llm_completion_tokens", completion_tokens, model=modelname)
+    metrics.incr("llm_cost_usd", cost, model=modelname)
+    metrics.observe("llm_latency_seconds", latency, model=modelname)
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.record(modelname, prompt_tokens, completion_tokens, latency, cost)